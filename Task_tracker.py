@@ -1,7 +1,15 @@
+from collections import Counter
+from collections import defaultdict
+from dataclasses import astuple
 from dataclasses import dataclass
 from datetime import date
 from typing import Dict
+from typing import Iterable
+from typing import List
 from typing import Optional
+import bisect
+import html
+import os
 import urllib.parse
 
 import sqlalchemy as sa
@@ -9,6 +17,7 @@ import streamlit as st
 from sqlalchemy import Boolean
 from sqlalchemy import Column
 from sqlalchemy import Date
+from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import MetaData
 from sqlalchemy import String
@@ -28,9 +37,15 @@ st.set_page_config(
 
 # local_css("style.css")
 
-def inject_css():
-    with open("style.css") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+# The file modification time is part of the cache key,
+# so editing style.css invalidates the cached blob
+@st.cache_data
+def _css_blob(path: str, mtime: float) -> str:
+    with open(path) as f:
+        return f"<style>{f.read()}</style>"
+
+def inject_css(path: str = "style.css"):
+    st.markdown(_css_blob(path, os.path.getmtime(path)), unsafe_allow_html=True)
 
 inject_css()
 
@@ -41,17 +56,20 @@ inject_css()
 
 TABLE_NAME = "todo"
 SESSION_STATE_KEY_TODOS = "todos_data"
+SESSION_STATE_KEY_TODOS_QUERY = "todos_query"
 
 
-@dataclass
+# Fields are declared in the same order as the table columns in connect_table(),
+# so rows can be unpacked positionally without going through row._mapping
+@dataclass(slots=True, frozen=True)
 class Todo:
     id: Optional[int] = None
     title: str = ""
     description: Optional[str] = None
     label: Optional[str] = None 
-    requester: Optional[str] = None
     priority: Optional[str] = "medium"
     status: Optional[str] = "to-do"
+    requester: Optional[str] = None
     created_at: Optional[date] = None
     due_at: Optional[date] = None
     done: bool = False
@@ -60,25 +78,34 @@ class Todo:
     @classmethod
     def from_row(cls, row):
         if row:
-            return cls(**row._mapping)
+            return cls(*row)
         return None
     
 ##################################################
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Subtask:
     id: Optional[int] = None
     todo_id: int = None
     title: str = ""
     done: bool = False
 
+    # Same positional unpacking as Todo.from_row
     @classmethod
     def from_row(cls, row):
         if row:
-            return cls(**row._mapping)
+            return cls(*row)
         return None
 
 
 
+# Write counters shared by all sessions of this Streamlit server process.
+# They key the st.cache_data query caches, which are process-wide as well,
+# so no session reads an entry that was cached before another session's write.
+@st.cache_resource
+def data_versions() -> Counter:
+    return Counter()
+
+
 # Use st.cache_resource to define the database table structure only once
 # and share it across all user sessions connected to this Streamlit server process.
 # This avoids redefining the table structure on every script rerun or for every user.
@@ -107,6 +134,14 @@ def connect_table():
         Column("title", String(100)),
         Column("done", Boolean, default=False),
     )
+
+    # Indexes matching the sidebar filters and sort options, and the subtask lookup.
+    # Created by the "Create table" admin action, also on already existing tables
+    Index("ix_todo_filter", todo_table.c.label, todo_table.c.priority, todo_table.c.status, todo_table.c.done)
+    Index("ix_todo_due_at", todo_table.c.due_at)
+    Index("ix_todo_created_at", todo_table.c.created_at)
+    Index("ix_subtasks_todo_id", subtask_table.c.todo_id)
+
     return metadata_obj, todo_table, subtask_table
 
 
@@ -120,22 +155,119 @@ def check_table_exists(connection: SQLConnection, table_name: str) -> bool:
     return inspector.has_table(table_name)
 
 
-def load_all_todos(connection: SQLConnection, table: Table) -> Dict[int, Todo]:
-    """Fetches all todos from the DB and returns as a dict keyed by id."""
-    stmt = sa.select(table).order_by(table.c.id)
+# The table practically never disappears, so the inspector round trip is done once
+# per process. The "Create table" admin action clears this cache.
+@st.cache_resource
+def _check_table_exists_cached(_connection: SQLConnection, table_name: str) -> bool:
+    return check_table_exists(_connection, table_name)
+
+
+def table_exists(connection: SQLConnection, table_name: str) -> bool:
+    """Only a positive result stays cached. While the table is missing it is checked
+    on every rerun, so a table created outside this app shows up without a restart."""
+    if _check_table_exists_cached(connection, table_name):
+        return True
+    _check_table_exists_cached.clear()
+    return False
+
+
+def has_todos(connection: SQLConnection, table: Table) -> bool:
+    """Checks whether the table holds at least one todo."""
+    stmt = sa.select(sa.exists().select_from(table))
+    with connection.session as session:
+        return bool(session.execute(stmt).scalar())
+
+
+def load_todos_filtered(
+    connection: SQLConnection,
+    table: Table,
+    labels: Iterable[str],
+    priorities: Iterable[str],
+    statuses: Iterable[str],
+    hide_done: bool,
+    sort_col: str,
+    ascending: bool,
+) -> Dict[int, Todo]:
+    """Fetches the todos matching the filters from the DB, in display order, as a dict keyed by id."""
+    sort_column = table.c[sort_col]
+    order = sort_column.asc() if ascending else sort_column.desc()
+    stmt = (
+        sa.select(table)
+        .where(
+            table.c.label.in_(list(labels)),
+            table.c.priority.in_(list(priorities)),
+            table.c.status.in_(list(statuses)),
+        )
+        .order_by(order.nullslast(), table.c.id)
+    )
+    if hide_done:
+        # done is nullable, a NULL counts as not done
+        stmt = stmt.where(table.c.done.is_not(True))
+
     with connection.session as session:
         result = session.execute(stmt)
         todos = [Todo.from_row(row) for row in result.all()]
         return {todo.id: todo for todo in todos if todo}
 
 
-def load_todo(connection: SQLConnection, table: Table, todo_id: int) -> Optional[Todo]:
-    """Fetches a single todo by id from the DB."""
-    stmt = sa.select(table).where(table.c.id == todo_id)
-    with connection.session as session:
-        result = session.execute(stmt)
-        row = result.first()
-        return Todo.from_row(row)
+# Cached wrapper around load_todos_filtered. Arguments prefixed with "_" are not hashed,
+# so the cache is keyed by the filters and the version counter, which callbacks bump
+# after every write. Reruns that don't change the filters reuse the cached dict.
+@st.cache_data(ttl=300)
+def _load_todos_filtered_cached(
+    _connection: SQLConnection,
+    _table: Table,
+    version: int,
+    labels: tuple,
+    priorities: tuple,
+    statuses: tuple,
+    hide_done: bool,
+    sort_col: str,
+    ascending: bool,
+) -> Dict[int, Todo]:
+    return load_todos_filtered(
+        _connection, _table, labels, priorities, statuses, hide_done, sort_col, ascending
+    )
+
+
+def todo_matches_filters(
+    todo: Todo,
+    labels: tuple,
+    priorities: tuple,
+    statuses: tuple,
+    hide_done: bool,
+) -> bool:
+    """Python equivalent of the WHERE clause in load_todos_filtered.
+    Takes the filter tuples stored in todos_query, at most a handful of options each."""
+    return (
+        todo.label in labels
+        and todo.priority in priorities
+        and todo.status in statuses
+        and not (hide_done and todo.done)
+    )
+
+
+def todo_sort_key(todo: Todo, sort_col: str, ascending: bool) -> tuple:
+    """Python equivalent of the ORDER BY in load_todos_filtered: NULLs last, ties by id."""
+    value = getattr(todo, sort_col)
+    if value is None:
+        return (True, 0, todo.id)
+    ordinal = value.toordinal()
+    return (False, ordinal if ascending else -ordinal, todo.id)
+
+
+def insert_sorted(todos: Dict[int, Todo], todo: Todo, sort_col: str, ascending: bool) -> Dict[int, Todo]:
+    """Returns the ordered todos dict with todo placed at its sorted position.
+    Uses a binary search on the sort keys instead of sorting the whole list again."""
+    ordered = [t for t in todos.values() if t.id != todo.id]
+    keys = [todo_sort_key(t, sort_col, ascending) for t in ordered]
+    ordered.insert(bisect.bisect(keys, todo_sort_key(todo, sort_col, ascending)), todo)
+    return {t.id: t for t in ordered}
+
+
+def bump_todos_version() -> int:
+    data_versions()["todos"] += 1
+    return data_versions()["todos"]
 
 
 ##################################################
@@ -146,7 +278,22 @@ def load_todo(connection: SQLConnection, table: Table, todo_id: int) -> Optional
 # The usual workflow for those callbacks is:
 # 1. Get form input data through st.session_state form widget keys,
 # 2. Perform database operations,
-# 3. Refresh session state by reading from database.
+# 3. Apply the change to session state, and bump the todos version so cached
+#    query results for other filters are not reused.
+
+
+def store_todo(todo: Todo):
+    """Applies a written todo to the session todos: placed at its sorted position
+    if it matches the current filters, dropped from the list otherwise."""
+    todos = st.session_state[SESSION_STATE_KEY_TODOS]
+    todos_query = st.session_state.get(SESSION_STATE_KEY_TODOS_QUERY)
+    if todos_query is None:
+        todos[todo.id] = todo
+    elif todo_matches_filters(todo, *todos_query[:4]):
+        sort_col, ascending = todos_query[4:]
+        st.session_state[SESSION_STATE_KEY_TODOS] = insert_sorted(todos, todo, sort_col, ascending)
+    else:
+        todos.pop(todo.id, None)
 
 
 def create_todo_callback(connection: SQLConnection, table: Table):
@@ -168,14 +315,16 @@ def create_todo_callback(connection: SQLConnection, table: Table):
     }
 
     # 2. Perform database operations
-    stmt = table.insert().values(**new_todo_data)
+    # RETURNING hands back the inserted row, no need for a follow-up SELECT
+    stmt = table.insert().values(**new_todo_data).returning(*table.c)
     with connection.session as session:
         # probably needs a try...except but eh
-        session.execute(stmt)
+        row = session.execute(stmt).first()
         session.commit()
 
-    # 3. Refresh session state from database
-    st.session_state[SESSION_STATE_KEY_TODOS] = load_all_todos(conn, todo_table)
+    # 3. Refresh session state from the returned row
+    bump_todos_version()
+    store_todo(Todo.from_row(row))
 
 
 def open_update_callback(todo_id: int):
@@ -204,15 +353,19 @@ def update_todo_callback(connection: SQLConnection, table: Table, todo_id: int):
         return
 
     # 2. Perform database operations
-    stmt = table.update().where(table.c.id == todo_id).values(**updated_values)
+    stmt = (
+        table.update()
+        .where(table.c.id == todo_id)
+        .values(**updated_values)
+        .returning(*table.c)
+    )
     with connection.session as session:
-        session.execute(stmt)
+        row = session.execute(stmt).first()
         session.commit()
 
-    # 3. Refresh session state from database
-    st.session_state[SESSION_STATE_KEY_TODOS][todo_id] = load_todo(
-        connection, table, todo_id
-    )
+    # 3. Refresh session state from the returned row
+    bump_todos_version()
+    store_todo(Todo.from_row(row))
     st.session_state[f"currently_editing__{todo_id}"] = False
 
 
@@ -225,8 +378,9 @@ def delete_todo_callback(connection: SQLConnection, table: Table, todo_id: int):
         session.execute(stmt)
         session.commit()
 
-    # 3. Refresh session state from database
-    st.session_state[SESSION_STATE_KEY_TODOS] = load_all_todos(conn, todo_table)
+    # 3. Remove the todo from session state
+    bump_todos_version()
+    st.session_state[SESSION_STATE_KEY_TODOS].pop(todo_id, None)
     st.session_state[f"currently_editing__{todo_id}"] = False
 
 
@@ -236,16 +390,18 @@ def mark_done_callback(connection: SQLConnection, table: Table, todo_id: int):
 
     # 2. Perform database operations
     stmt = (
-        table.update().where(table.c.id == todo_id).values(done=not current_done_status)
+        table.update()
+        .where(table.c.id == todo_id)
+        .values(done=not current_done_status)
+        .returning(*table.c)
     )
     with connection.session as session:
-        session.execute(stmt)
+        row = session.execute(stmt).first()
         session.commit()
 
-    # 3. Refresh session state from database
-    st.session_state[SESSION_STATE_KEY_TODOS][todo_id] = load_todo(
-        connection, table, todo_id
-    )
+    # 3. Refresh session state from the returned row
+    bump_todos_version()
+    store_todo(Todo.from_row(row))
 
 # --- Subtask Callbacks ---#
 def load_subtasks(connection, subtask_table, todo_id):
@@ -254,23 +410,83 @@ def load_subtasks(connection, subtask_table, todo_id):
         result = session.execute(stmt)
         return [Subtask.from_row(row) for row in result.fetchall()]
 
+def load_all_subtasks(connection: SQLConnection, subtask_table: Table, todo_ids: Iterable[int]) -> Dict[int, List[Subtask]]:
+    """Fetches the subtasks of all given todos in one query, grouped by todo id."""
+    todo_ids = list(todo_ids)
+    subtasks_by_todo = defaultdict(list)
+    if not todo_ids:
+        return subtasks_by_todo
+
+    stmt = (
+        sa.select(subtask_table)
+        .where(subtask_table.c.todo_id.in_(todo_ids))
+        .order_by(subtask_table.c.id)
+    )
+    with connection.session as session:
+        result = session.execute(stmt)
+        for row in result.all():
+            subtasks_by_todo[row.todo_id].append(Subtask.from_row(row))
+    return subtasks_by_todo
+
+# Same idea as _load_todos_filtered_cached: keyed by the todo ids on screen
+# and a version counter bumped by every subtask write.
+@st.cache_data(ttl=60)
+def _load_all_subtasks_cached(_connection: SQLConnection, _subtask_table: Table, todo_ids: tuple, version: int) -> Dict[int, List[Subtask]]:
+    return load_all_subtasks(_connection, _subtask_table, todo_ids)
+
+def bump_subtasks_version() -> int:
+    data_versions()["subtasks"] += 1
+    return data_versions()["subtasks"]
+
 def create_subtask(connection, subtask_table, todo_id, title):
     stmt = subtask_table.insert().values(todo_id=todo_id, title=title, done=False)
     with connection.session as session:
         session.execute(stmt)
         session.commit()
+    bump_subtasks_version()
 
-def toggle_subtask_done(connection, subtask_table, subtask_id, new_done):
-    stmt = subtask_table.update().where(subtask_table.c.id == subtask_id).values(done=new_done)
+def set_subtasks_done(connection, subtask_table, changes: Dict[int, bool]):
+    """Writes several subtask done flags at once, as a single UPDATE with a CASE on the id."""
+    if not changes:
+        return
+    done_ids = [subtask_id for subtask_id, new_done in changes.items() if new_done]
+    stmt = (
+        subtask_table.update()
+        .where(subtask_table.c.id.in_(list(changes)))
+        .values(done=sa.case((subtask_table.c.id.in_(done_ids), True), else_=False))
+    )
     with connection.session as session:
         session.execute(stmt)
         session.commit()
+    bump_subtasks_version()
 
 def mark_all_subtasks_done(connection, subtask_table, todo_id):
     stmt = subtask_table.update().where(subtask_table.c.todo_id == todo_id).values(done=True)
     with connection.session as session:
         session.execute(stmt)
         session.commit()
+    bump_subtasks_version()
+
+def save_subtasks_callback(connection, subtask_table, subtasks: List[Subtask]):
+    # Only write the subtasks whose checkbox differs from the database
+    changed = {
+        sub.id: st.session_state[f"subtask_{sub.id}"]
+        for sub in subtasks
+        if st.session_state[f"subtask_{sub.id}"] != sub.done
+    }
+    set_subtasks_done(connection, subtask_table, changed)
+
+def mark_all_subtasks_done_callback(connection, subtask_table, todo_id, subtasks: List[Subtask]):
+    mark_all_subtasks_done(connection, subtask_table, todo_id)
+    # Checkbox values persist in their widget keys, drop them
+    # so the checkboxes are rebuilt from the reloaded subtasks
+    for sub in subtasks:
+        st.session_state.pop(f"subtask_{sub.id}", None)
+
+def create_subtask_callback(connection, subtask_table, todo_id):
+    title = st.session_state[f"new_subtask_{todo_id}"].strip()
+    if title:
+        create_subtask(connection, subtask_table, todo_id, title)
 
 
 
@@ -282,6 +498,9 @@ def mark_all_subtasks_done(connection, subtask_table, todo_id):
 # They take data like a Todo object and display it using Streamlit widgets.
 
 
+# Links only depend on fields that change when the todo is edited,
+# so cards reuse the cached link across reruns and sessions
+@st.cache_data(max_entries=4096)
 def generate_gcal_link(title: str, description: str, due_date: date) -> str:
     base = "https://calendar.google.com/calendar/render"
     start = due_date.strftime("%Y%m%dT090000Z")
@@ -295,58 +514,62 @@ def generate_gcal_link(title: str, description: str, due_date: date) -> str:
     return f"{base}?{urllib.parse.urlencode(params)}"
 
 
+# Builds the static part of a todo card (title, meta info, description, requester,
+# due date and calendar button) as one HTML string, rendered by a single st.markdown
+# call instead of one element each. The cache is keyed on the todo's field values
+# (Todo objects from different script runs are different classes and never compare
+# equal). User text is escaped since the HTML is rendered unsafe.
+@st.cache_data(max_entries=1024)
+def todo_card_html(todo_fields: tuple) -> str:
+    todo_item = Todo(*todo_fields)
+
+    def strike(text: str) -> str:
+        return f"<s>{text}</s>" if todo_item.done else text
+
+    grey = "<span style='color: grey;'><em>{}</em></span>"
+
+    meta_items = []
+    if todo_item.label:
+        meta_items.append(f"🏷️ <strong>{html.escape(todo_item.label.title())}</strong>")
+    if todo_item.priority:
+        meta_items.append(f"🔵 <strong>{html.escape(todo_item.priority.title())}</strong>")
+    if todo_item.status:
+        meta_items.append(f"📌 <strong>{html.escape(todo_item.status.title())}</strong>")
+    # Join all with vertical bars
+    meta_text = " &nbsp;|&nbsp; ".join(meta_items)
+
+    if todo_item.description:
+        display_description = strike(html.escape(todo_item.description).replace("\n", "<br>"))
+    else:
+        display_description = strike(grey.format("No description"))
+    display_requester = html.escape(todo_item.requester) if todo_item.requester else grey.format("No requester")
+    display_due_date = strike(f"Due {todo_item.due_at.strftime('%Y-%m-%d')}")
+
+    calendar_link = html.escape(generate_gcal_link(todo_item.title, todo_item.description, todo_item.due_at))
+
+    return (
+        "<div>"
+        "<div class='flex-row'>"
+        f"<h3>{strike(html.escape(todo_item.title))}</h3>"
+        f"<div style='text-align: right; font-size: 14px;'>{meta_text}</div>"
+        "</div>"
+        f"<p>{display_description}</p>"
+        f"<p><strong>Requester:</strong> {display_requester}</p>"
+        f"<p style='font-size: 14px; color: grey;'>{display_due_date}</p>"
+        f'<a href="{calendar_link}" target="_blank"><button style="background-color:#e0e0e0; color:#333; font-size:12px; padding:4px 8px; border:none; border-radius:4px;">📅 Add to Google Calendar</button></a>'
+        "</div>"
+    )
+
+
 # Function to display a single todo item as a card
 
 
-def todo_card(connection: SQLConnection, todo_table: Table, subtask_table: Table, todo_item: Todo):
+def todo_card(connection: SQLConnection, todo_table: Table, subtask_table: Table, todo_item: Todo, subtasks: List[Subtask]):
     todo_id = todo_item.id
 
     with st.container(border=True):
-        # Top row: Title and Meta Info
-        title_col, meta_col = st.columns([3, 2])
-        with title_col:
-            display_title = todo_item.title
-            if todo_item.done:
-                display_title = f"~~{display_title}~~"
-            st.subheader(display_title)
-
-        with meta_col:
-            meta_items = []
-
-            if todo_item.label:
-                meta_items.append(f"🏷️ <strong>{todo_item.label.title()}</strong>")
-            if todo_item.priority:
-                meta_items.append(f"🔵 <strong>{todo_item.priority.title()}</strong>")
-            if todo_item.status:
-                meta_items.append(f"📌 <strong>{todo_item.status.title()}</strong>")
-
-            # Join all with vertical bars
-            meta_text = " &nbsp;|&nbsp; ".join(meta_items)
-
-            st.markdown(f"<div style='text-align: right; font-size: 14px;'>{meta_text}</div>", unsafe_allow_html=True)
-
-
-        # Description
-        display_description = todo_item.description or ":grey[*No description*]"
-        if todo_item.done:
-            display_description = f"~~{display_description}~~"
-        st.markdown(display_description)
-
-        # Requester and Due Date
-        display_requester = todo_item.requester or ":grey[*No requester*]"
-        display_due_date = f"Due {todo_item.due_at.strftime('%Y-%m-%d')}"
-        if todo_item.done:
-            display_due_date = f"~~{display_due_date}~~"
-        st.markdown(f"**Requester:** {display_requester}")
-        st.caption(display_due_date)
-
-        calendar_link = generate_gcal_link(todo_item.title, todo_item.description, todo_item.due_at)
-
-        st.markdown(
-            f'<a href="{calendar_link}" target="_blank"><button style="background-color:#e0e0e0; color:#333; font-size:12px; padding:4px 8px; border:none; border-radius:4px;">📅 Add to Google Calendar</button></a>',
-            unsafe_allow_html=True,
-        )
-
+        # Static part of the card in a single markdown element
+        st.markdown(todo_card_html(astuple(todo_item)), unsafe_allow_html=True)
 
         # === Main Actions ===
         done_col, edit_col, delete_col = st.columns(3)
@@ -380,8 +603,6 @@ def todo_card(connection: SQLConnection, todo_table: Table, subtask_table: Table
         st.divider()
 
         # === Subtasks ===
-        # === Subtasks ===
-        subtasks = load_subtasks(connection, subtask_table, todo_id)
         with st.expander("Subtasks", expanded=True):
             if subtasks:
                 st.markdown("**Subtasks:**")
@@ -390,40 +611,44 @@ def todo_card(connection: SQLConnection, todo_table: Table, subtask_table: Table
                 total_count = len(subtasks)
                 st.progress(completed_count / total_count, text=f"{completed_count}/{total_count} completed")
 
-                for sub in subtasks:
-                    label_text = f"~~{sub.title}~~" if sub.done else sub.title
-                    checkbox_key = f"subtask_{sub.id}"
-
-                    if checkbox_key not in st.session_state:
-                        st.session_state[checkbox_key] = sub.done
-
-                    new_done = st.checkbox(
-                        label=label_text,
-                        value=sub.done,
-                        key=checkbox_key,
+                # Checkboxes live in a form so toggling them doesn't rerun the script,
+                # all changes are written at once on submit
+                with st.form(f"subtask_form_{todo_id}"):
+                    for sub in subtasks:
+                        label_text = f"~~{sub.title}~~" if sub.done else sub.title
+                        st.checkbox(
+                            label=label_text,
+                            value=sub.done,
+                            key=f"subtask_{sub.id}",
+                        )
+
+                    save_col, mark_all_col = st.columns(2)
+                    save_col.form_submit_button(
+                        "Save",
+                        icon=":material/save:",
+                        on_click=save_subtasks_callback,
+                        args=(connection, subtask_table, subtasks),
+                        use_container_width=True,
+                    )
+                    mark_all_col.form_submit_button(
+                        "Mark all done",
+                        icon=":material/done_all:",
+                        on_click=mark_all_subtasks_done_callback,
+                        args=(connection, subtask_table, todo_id, subtasks),
+                        disabled=completed_count == total_count,
+                        use_container_width=True,
                     )
-
-                    # Only trigger if value actually changed
-                    if new_done != sub.done:
-                        toggle_subtask_done(connection, subtask_table, sub.id, new_done)
-                        st.rerun()
-
-
-                # Mark all done
-                if completed_count < total_count:
-                    if st.button("✅ Mark All Done", key=f"mark_all_done_{todo_id}"):
-                        mark_all_subtasks_done(connection, subtask_table, todo_id)
-                        st.rerun()
             else:
                 st.caption("No subtasks yet.")
 
             # Subtask Form
             with st.form(f"new_subtask_form_{todo_id}", clear_on_submit=True):
-                new_subtask = st.text_input("Add subtask", key=f"new_subtask_{todo_id}")
-                if st.form_submit_button("Add"):
-                    if new_subtask.strip():
-                        create_subtask(connection, subtask_table, todo_id, new_subtask.strip())
-                        st.rerun()
+                st.text_input("Add subtask", key=f"new_subtask_{todo_id}")
+                st.form_submit_button(
+                    "Add",
+                    on_click=create_subtask_callback,
+                    args=(connection, subtask_table, todo_id),
+                )
 
 
 
@@ -507,12 +732,20 @@ def todo_edit_widget(connection: SQLConnection, table: Table, todo_item: Todo):
 # This function is used to display a todo item, either as a card or an edit widget
 # It checks if the user is currently editing the todo item and displays the appropriate UI.
 @st.fragment
-def todo_component(connection: SQLConnection, todo_table: Table, subtask_table: Table, todo_id: int):
-    todo_item = st.session_state[SESSION_STATE_KEY_TODOS][todo_id]
+def todo_component(connection: SQLConnection, todo_table: Table, subtask_table: Table, todo_id: int, subtasks: List[Subtask], subtasks_version: int):
+    todo_item = st.session_state[SESSION_STATE_KEY_TODOS].get(todo_id)
+    if todo_item is None:
+        # An edit moved the todo out of the current filters
+        return
     currently_editing = st.session_state.get(f"currently_editing__{todo_id}", False)
 
+    # A fragment rerun reuses the arguments of the last app run, so after a subtask
+    # write the preloaded subtasks are stale and only this todo's are reloaded
+    if subtasks_version != data_versions()["subtasks"]:
+        subtasks = load_subtasks(connection, subtask_table, todo_id)
+
     if not currently_editing:
-        todo_card(connection, todo_table, subtask_table, todo_item)
+        todo_card(connection, todo_table, subtask_table, todo_item, subtasks)
     else:
         todo_edit_widget(connection, todo_table, todo_item)
 
@@ -525,7 +758,9 @@ def todo_component(connection: SQLConnection, todo_table: Table, subtask_table:
 st.title("Task Tracker")
 
 #conn = st.connection("todo_db", ttl=5 * 60)
-conn = st.connection("supabase_db", ttl=5 * 60)
+# No ttl: the connection and its engine pool live for the whole process,
+# instead of being torn down and reconnected every few minutes
+conn = st.connection("supabase_db")
 metadata_obj, todo_table, subtask_table = connect_table()
 
 
@@ -539,6 +774,11 @@ with st.sidebar:
         help="Creates the 'todo' table if it doesn't exist.",
     ):
         metadata_obj.create_all(conn.engine)
+        # create_all skips the indexes of tables that already exist
+        for table in (todo_table, subtask_table):
+            for index in table.indexes:
+                index.create(conn.engine, checkfirst=True)
+        _check_table_exists_cached.clear()
         st.toast("Todo table created successfully!", icon="✅")
     
     st.subheader("Filter Tasks")
@@ -573,55 +813,77 @@ with st.sidebar:
     
 
     st.divider()
-    st.subheader("Session State Debug", help="Is not updated by fragment rerun!")
-    st.json(st.session_state)
+    # Expander content is still built on every rerun, so the dump is also gated
+    # behind a toggle and skips large containers like the todos dict
+    with st.expander("Session State Debug", expanded=False):
+        if st.toggle("Show session state", help="Is not updated by fragment rerun!"):
+            st.json({
+                k: v for k, v in st.session_state.items()
+                if not isinstance(v, (dict, list)) or len(v) < 50
+            })
 
 
 # --- Display list of Todo items ---
 
 # 1. Check if database table exists. Else redirect to admin sidebar for creation
-if not check_table_exists(conn, TABLE_NAME):
+if not table_exists(conn, TABLE_NAME):
     st.warning("Create table from admin sidebar", icon="⚠")
     st.stop()
 
-# 2. Load database items into session state.
-#    This happens on the first run or if the state was cleared.
-if SESSION_STATE_KEY_TODOS not in st.session_state:
+# 2. Load the todos matching the filters into session state.
+#    This happens on the first run, or when the filters changed. Callbacks keep
+#    the list up to date in between, and the cached query only hits the database
+#    for filters not seen since the last todos version bump.
+#    Filters are sets, so sort them for a key that ignores selection order.
+flab = tuple(sorted(set(filter_label)))
+fpri = tuple(sorted(set(filter_priority)))
+fsts = tuple(sorted(set(filter_status)))
+todos_query = (flab, fpri, fsts, hide_done, sort_by, sort_ascending == "Ascending")
+if (
+    SESSION_STATE_KEY_TODOS not in st.session_state
+    or st.session_state.get(SESSION_STATE_KEY_TODOS_QUERY) != todos_query
+):
+    st.session_state[SESSION_STATE_KEY_TODOS_QUERY] = todos_query
     with st.spinner("Loading Todos..."):
-        st.session_state[SESSION_STATE_KEY_TODOS] = load_all_todos(conn, todo_table)
+        st.session_state[SESSION_STATE_KEY_TODOS] = _load_todos_filtered_cached(
+            conn,
+            todo_table,
+            data_versions()["todos"],
+            *todos_query,
+        )
 
 
-# 3. Display Todos from Session State
+# 3. Display Todos from Session State, already filtered and sorted by the query
 current_todos: Dict[int, Todo] = st.session_state.get(SESSION_STATE_KEY_TODOS, {})
-
-# Convert to list for filtering
 filtered_todos = list(current_todos.values())
 
-# Apply filters
-filtered_todos = [
-    todo for todo in filtered_todos
-    if todo.label in filter_label and
-       todo.priority in filter_priority and
-       todo.status in filter_status and
-       (not hide_done or not todo.done)
-]
 # If no todos match the filters, show a message
-if not filtered_todos and current_todos:
+if not filtered_todos and has_todos(conn, todo_table):
     st.warning("No todos match the selected filters.", icon="⚠️")
-elif not current_todos:
+elif not filtered_todos:
     st.info("No tasks in the database yet. Add one below 👇", icon="ℹ️")
 
-
-# Apply sorting
-reverse_sort = sort_ascending == "Descending"
-filtered_todos.sort(key=lambda x: getattr(x, sort_by) or date.max, reverse=reverse_sort)
+# Load subtasks of all displayed todos in a single query.
+# The version is read once, so the fragments get the version the data was loaded at
+subtasks_version = data_versions()["subtasks"]
+subtasks_by_todo = _load_all_subtasks_cached(
+    conn,
+    subtask_table,
+    tuple(todo.id for todo in filtered_todos),
+    subtasks_version,
+)
 
 # Render filtered todos
 for todo in filtered_todos:
     todo_id = todo.id
-    if f"currently_editing__{todo_id}" not in st.session_state:
-        st.session_state[f"currently_editing__{todo_id}"] = False
-    todo_component(conn, todo_table, subtask_table, todo_id)
+    todo_component(
+        conn,
+        todo_table,
+        subtask_table,
+        todo_id,
+        subtasks_by_todo.get(todo_id, []),
+        subtasks_version,
+    )
 
 
 # --- Display create Todo form ---